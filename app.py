@@ -1,8 +1,11 @@
-import io
+import hashlib
 import json
 from typing import List
 
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
 import pydeck as pdk
 import streamlit as st
 
@@ -21,7 +24,13 @@ REQUIRED_COLS: List[str] = [
     "rail_incl_corrected", "misplacement",
     "rail_top_amsl", "asphalt_amsl", "shoulder_amsl",
 ]
+_REQUIRED_COLS_SET = set(REQUIRED_COLS)
 EDITABLE_COLS = ["rail_incl_corrected", "misplacement"]
+FLOAT_COLS = [
+    "lat", "lon", "rail_incl_corrected", "misplacement",
+    "rail_top_amsl", "asphalt_amsl", "shoulder_amsl",
+]
+FLOAT64_COLS = ["lat", "lon"] + EDITABLE_COLS
 
 # ---------------------- Session state ----------------------
 if "edits" not in st.session_state:
@@ -30,22 +39,39 @@ if "selected_row_id" not in st.session_state:
     st.session_state.selected_row_id = None
 
 
-@st.cache_data(show_spinner=True)
-def load_data(name: str, data_bytes: bytes) -> pd.DataFrame:
+def upload_digest(uploaded) -> str:
+    """Content hash of an upload, computed once per uploaded file rather than per rerun."""
+    if st.session_state.get("upload_file_id") != uploaded.file_id:
+        with uploaded.getbuffer() as buf:
+            st.session_state.upload_digest = hashlib.blake2b(buf, digest_size=16).hexdigest()
+        st.session_state.upload_file_id = uploaded.file_id
+    return st.session_state.upload_digest
+
+
+# Keyed on (name, digest); underscored _file is not hashed
+@st.cache_data(show_spinner=True, max_entries=4)
+def load_data(name: str, digest: str, _file) -> pd.DataFrame:
     name_l = (name or "").lower()
 
     if any(name_l.endswith(ext) for ext in [
         ".parquet", ".parq", ".pq", ".parquet.gzip", ".parq.gz", ".pq.gz"
     ]):
         try:
-            df = pd.read_parquet(io.BytesIO(data_bytes), engine="pyarrow", columns=REQUIRED_COLS)
+            _file.seek(0)
+            df = pd.read_parquet(_file, engine="pyarrow", columns=REQUIRED_COLS, dtype_backend="pyarrow")
         except Exception:
-            df = pd.read_parquet(io.BytesIO(data_bytes), engine="pyarrow")
+            _file.seek(0)
+            df = pd.read_parquet(_file, engine="pyarrow", dtype_backend="pyarrow")
     else:
+        # Callable usecols: missing columns don't raise, the check below reports them
         try:
-            df = pd.read_csv(io.BytesIO(data_bytes), low_memory=False)
+            _file.seek(0)
+            df = pd.read_csv(_file, low_memory=False, usecols=lambda c: c in _REQUIRED_COLS_SET,
+                             dtype_backend="pyarrow")
         except Exception:
-            df = pd.read_csv(io.BytesIO(data_bytes), low_memory=False, encoding="latin-1")
+            _file.seek(0)
+            df = pd.read_csv(_file, low_memory=False, usecols=lambda c: c in _REQUIRED_COLS_SET,
+                             encoding="latin-1", dtype_backend="pyarrow")
 
     missing = [c for c in REQUIRED_COLS if c not in df.columns]
     if missing:
@@ -53,18 +79,31 @@ def load_data(name: str, data_bytes: bytes) -> pd.DataFrame:
 
     df = df[REQUIRED_COLS].copy()
 
+    # Arrow-backed numerics; float32 except FLOAT64_COLS
+    for c in FLOAT_COLS:
+        col = df[c] if pd.api.types.is_numeric_dtype(df[c]) else pd.to_numeric(df[c], errors="coerce")
+        # from_pandas=True turns NaN into null; Arrow floats otherwise keep NaN as a value
+        arr = pa.array(
+            col.to_numpy(dtype="float64", na_value=np.nan),
+            type=pa.float64() if c in FLOAT64_COLS else pa.float32(),
+            from_pandas=True,
+        )
+        df[c] = pd.Series(arr, index=df.index, dtype=pd.ArrowDtype(arr.type))
+
     # Ensure ts is datetime
     if not pd.api.types.is_datetime64_any_dtype(df["ts"]):
         with pd.option_context("mode.chained_assignment", None):
             df["ts"] = pd.to_datetime(df["ts"], errors="coerce", utc=True)
 
-    df["hour"] = df["ts"].dt.hour.astype("Int8")
+    df["hour"] = df["ts"].dt.hour.astype("int8[pyarrow]")
     df = df.reset_index(drop=True)
-    df["row_id"] = df.index.astype("Int64")
+    # row_id mirrors the RangeIndex, so df.loc[row_id] is a direct lookup
+    df["row_id"] = df.index.astype("int32")
 
-    # Color → hex via your util, then to RGB for pydeck
-    df["color_hex"] = df["misplacement"].apply(lambda v: get_color(v))
-    df["rgb"] = df["color_hex"].apply(hex_to_rgb_list)
+    # Color → hex via your util, then to RGB for pydeck (one lookup per distinct color)
+    df["color_hex"] = get_colors(df["misplacement"])
+    rgb_by_color = {c: hex_to_rgb_list(c) for c in df["color_hex"].unique()}
+    df["rgb"] = df["color_hex"].map(rgb_by_color)
 
     return df
 
@@ -77,8 +116,9 @@ if not uploaded:
     st.info("Upload a file with at least: lat, lon, ts, fwd_path, pole_id, rail_incl_corrected, misplacement.")
     st.stop()
 
+digest = upload_digest(uploaded)
 try:
-    df = load_data(uploaded.name, uploaded.getvalue())
+    df = load_data(uploaded.name, digest, uploaded)
 except Exception as e:
     st.error(str(e))
     st.stop()
@@ -94,15 +134,21 @@ with st.sidebar:
     show_img = st.checkbox("Show forward image in tooltip", value=True,
                            help="Disable if hovering becomes heavy on slow networks.")
 
-subset = df[df["hour"].isin(sel_hours)] if sel_hours else df
+# Hour filter as a mask (Arrow is_in); rows are gathered once, after the range filter
+if sel_hours:
+    hour_mask = pc.is_in(pa.array(df["hour"]), value_set=pa.array(sel_hours, type=pa.int8()))
+    hour_mask = hour_mask.to_numpy(zero_copy_only=False)
+else:
+    hour_mask = np.ones(len(df), dtype=bool)
+hour_row_ids = df["row_id"].to_numpy()[hour_mask]
 
 with st.sidebar:
     st.subheader("Render row range")
-    if subset.empty:
+    if hour_row_ids.size == 0:
         st.info("No rows for the selected hours.")
         st.stop()
-    render_min = int(subset["row_id"].min())
-    render_max = int(subset["row_id"].max())
+    render_min = int(hour_row_ids.min())
+    render_max = int(hour_row_ids.max())
     render_start, render_end = st.slider(
         "Row IDs (inclusive)",
         min_value=render_min,
@@ -113,30 +159,14 @@ with st.sidebar:
         key="render_range",
     )
 
-# Final slice to render
-to_render = subset[(subset["row_id"] >= render_start) & (subset["row_id"] <= render_end)].copy()
+# Final slice to render (as a mask; build_layers gathers the rows)
+render_mask = hour_mask & df["row_id"].between(render_start, render_end).to_numpy()
 
-if to_render.empty:
+if not render_mask.any():
     st.warning("No rows match the selected hours and row range.")
     st.stop()
 
-# Add derived fields used by tooltip (avoid heavy formatting in HTML)
-to_render["mispl_str"] = to_render["misplacement"].map(lambda x: f"{x:.2f}" if pd.notna(x) else "—")
-to_render["rail_incl_str"] = to_render["rail_incl_corrected"].map(lambda x: f"{x:.0f}" if pd.notna(x) else "—")
-to_render["sv_url"] = to_render.apply(lambda r: street_view_url(r["lat"], r["lon"]), axis=1)
-
 # ---------------------- pydeck map ----------------------
-center_lat = float(to_render["lat"].mean())
-center_lon = float(to_render["lon"].mean())
-
-view_state = pdk.ViewState(
-    latitude=center_lat,
-    longitude=center_lon,
-    zoom=float(zoom_start),
-    pitch=0,
-    bearing=0,
-)
-
 st.markdown("""
 <style>
   /* Let tooltip capture clicks and sit above the canvas */
@@ -157,17 +187,80 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 
+# Cached so edit-panel reruns don't rebuild the layers; underscored args are not hashed
+@st.cache_resource(max_entries=2, ttl=600)
+def build_layers(digest: str, hours: tuple, render_start: int, render_end: int,
+                 show_img: bool, _df: pd.DataFrame, _render_mask: np.ndarray):
+    """Returns ([hover_layer, scatter], center_lat, center_lon) for the render slice."""
+    to_render = _df[_render_mask]
+
+    # Ship only the columns each layer reads
+    tooltip_cols = ["lat", "lon", "row_id", "pole_id"]
+    if show_img:
+        tooltip_cols.append("fwd_path")
+    # Derived fields used by tooltip (avoid heavy formatting in HTML)
+    hover_data = to_render[tooltip_cols].assign(
+        mispl_str=format_numbers(to_render["misplacement"], 2),
+        rail_incl_str=format_numbers(to_render["rail_incl_corrected"], 0),
+    )
+
+    # Invisible, larger picking layer (so hover doesn't flicker if you twitch the mouse)
+    hover_layer = pdk.Layer(
+        "ScatterplotLayer",
+        data=hover_data,
+        get_position='[lon, lat]',
+        get_radius=32,            # big-ish hover/tap target (in pixels)
+        radius_units="pixels",
+        get_fill_color=[100, 0, 0, 0.1],  # fully transparent
+        opacity=0.5,                # not visible
+        pickable=True,            # used only for picking + tooltip
+        stroked=False,
+    )
+
+    # Your tiny, visible dots — not pickable (tooltip comes from hover_layer)
+    scatter = pdk.Layer(
+        "ScatterplotLayer",
+        data=to_render[["lat", "lon", "rgb"]],
+        get_position='[lon, lat]',
+        get_fill_color="rgb",
+        opacity=0.8,
+        pickable=False,           # <-- turn off here
+        auto_highlight=True,
+        stroked=False,
+        radius_units="pixels",
+        get_radius=3,             # tiny visual dot
+        radius_min_pixels=1,
+        radius_max_pixels=12,
+    )
+
+    center_lat = float(to_render["lat"].mean())
+    center_lon = float(to_render["lon"].mean())
+    return [hover_layer, scatter], center_lat, center_lon  # invisible picker first
+
+
+layers, center_lat, center_lon = build_layers(
+    digest, tuple(sel_hours), render_start, render_end, show_img, df, render_mask,
+)
+
+view_state = pdk.ViewState(
+    latitude=center_lat,
+    longitude=center_lon,
+    zoom=float(zoom_start),
+    pitch=0,
+    bearing=0,
+)
 
+# pydeck fills {lat}/{lon} per point, so the Street View URL needs no per-row column
 tooltip_html = (
-    """
-<a href="{sv_url}" target="_blank" rel="noopener noreferrer"
+    f"""
+<a href="{street_view_url('{lat}', '{lon}')}" target="_blank" rel="noopener noreferrer"
    style="display:block; text-decoration:none; color:inherit;">
   <div style="width:{POPUP_W}px">
     <div style="font-weight:600;margin-bottom:6px;">Open Street View ↗</div>
-    <div><b>Row ID:</b> {row_id}</div>
-    <div><b>Pole:</b> {pole_id}</div>
-    <div><b>Rail incl:</b> {rail_incl_str}°</div>
-    <div><b>Misplacement:</b> {mispl_str} m</div>
+    <div><b>Row ID:</b> {{row_id}}</div>
+    <div><b>Pole:</b> {{pole_id}}</div>
+    <div><b>Rail incl:</b> {{rail_incl_str}}°</div>
+    <div><b>Misplacement:</b> {{mispl_str}} m</div>
 """
     + (
         f"""    <div style="margin-top:6px">
@@ -182,38 +275,8 @@ tooltip_html = (
 """
 )
 
-
-# Invisible, larger picking layer (so hover doesn't flicker if you twitch the mouse)
-hover_layer = pdk.Layer(
-    "ScatterplotLayer",
-    data=to_render,
-    get_position='[lon, lat]',
-    get_radius=32,            # big-ish hover/tap target (in pixels)
-    radius_units="pixels",
-    get_fill_color=[100, 0, 0, 0.1],  # fully transparent
-    opacity=0.5,                # not visible
-    pickable=True,            # used only for picking + tooltip
-    stroked=False,
-)
-
-# Your tiny, visible dots — not pickable (tooltip comes from hover_layer)
-scatter = pdk.Layer(
-    "ScatterplotLayer",
-    data=to_render,
-    get_position='[lon, lat]',
-    get_fill_color="rgb",
-    opacity=0.8,
-    pickable=False,           # <-- turn off here
-    auto_highlight=True,
-    stroked=False,
-    radius_units="pixels",
-    get_radius=3,             # tiny visual dot
-    radius_min_pixels=1,
-    radius_max_pixels=12,
-)
-
 deck = pdk.Deck(
-    layers=[hover_layer, scatter],  # invisible picker first
+    layers=layers,
     initial_view_state=view_state,
     tooltip={
         "html": tooltip_html,
@@ -225,7 +288,6 @@ deck = pdk.Deck(
     },
 )
 
-
 st.pydeck_chart(deck, use_container_width=True, height=600)
 
 # ---------------------- Editing panel ----------------------
@@ -257,8 +319,8 @@ with col_sel:
     s, e = int(start_id), int(end_id)
     if e < s:
         s, e = e, s
-    all_ids = set(df["row_id"].astype(int).tolist())
-    target_ids = [rid for rid in range(s, e + 1) if rid in all_ids]
+    # row_ids are contiguous (min_id..max_id), so clip instead of scanning the column
+    target_ids = list(range(max(s, min_id), min(e, max_id) + 1))
     row_exists = len(target_ids) > 0
 
 with col_info:
@@ -266,7 +328,7 @@ with col_info:
         st.info("No valid rows in the selected range. Adjust Start/End.")
     else:
         if len(target_ids) == 1:
-            row_for_preview = df.loc[df["row_id"] == target_ids[0]].iloc[0]
+            row_for_preview = df.loc[target_ids[0]]
             st.markdown(
                 f"**Pole:** `{row_for_preview['pole_id']}` &nbsp;&nbsp; "
                 f"**Lat/Lon:** {row_for_preview['lat']:.6f}, {row_for_preview['lon']:.6f} &nbsp;&nbsp; "
@@ -305,13 +367,14 @@ with col_info:
                     st.info("No changes provided.")
                 else:
                     ts = pd.Timestamp.utcnow().isoformat()
-                    for rid in target_ids:
-                        row_i = df.loc[df["row_id"] == rid].iloc[0]
+                    # str() per value: Series.astype(str) keeps nulls as NaN, which isn't valid JSON
+                    pole_ids = [str(p) for p in df.loc[target_ids, "pole_id"]]
+                    for rid, pole_id in zip(target_ids, pole_ids):
                         for col, val in new_vals.items():
                             if col in EDITABLE_COLS and (val is None or isinstance(val, float)):
                                 st.session_state.edits.append({
                                     "row_id": int(rid),
-                                    "pole_id": str(row_i["pole_id"]),
+                                    "pole_id": pole_id,
                                     "column": col,
                                     "new_value": None if val is None else float(val),
                                     "timestamp_utc": ts,
@@ -328,17 +391,9 @@ else:
     edits_df = pd.DataFrame(st.session_state.edits)
     st.dataframe(edits_df, width="stretch", hide_index=True)
 
-    # CSV (NaN as empty) and JSONL variants
-    csv_buf = io.StringIO()
-    edits_export = edits_df.copy()
-    edits_export["new_value"] = edits_export["new_value"].apply(lambda v: "" if v is None else v)
-    edits_export.to_csv(csv_buf, index=False)
-    csv_bytes = csv_buf.getvalue().encode("utf-8")
-
-    jsonl_buf = io.StringIO()
-    for rec in st.session_state.edits:
-        jsonl_buf.write(json.dumps(rec) + "\n")
-    jsonl_bytes = jsonl_buf.getvalue().encode("utf-8")
+    # CSV (to_csv already writes None/NaN as empty) and JSONL variants
+    csv_bytes = edits_df.to_csv(index=False).encode("utf-8")
+    jsonl_bytes = "".join(json.dumps(rec) + "\n" for rec in st.session_state.edits).encode("utf-8")
 
     cdl, cdl2, clr = st.columns([1, 1, 1])
     with cdl:
@@ -1,77 +1,156 @@
 import re
+from functools import lru_cache
 
+import numpy as np
 import pandas as pd
 from branca.element import MacroElement, Template
 
+try:
+    from numba import njit
+except ImportError:  # optional: get_color_idx falls back to plain NumPy
+    njit = None
+
+
+_SV_PREFIX = "https://www.google.com/maps/@?api=1&map_action=pano&viewpoint="
+_SV_DEFAULT_SUFFIX = "&heading=0&pitch=0&fov=90"
+
 
 def street_view_url(lat, lon, heading=0, pitch=0, fov=90):
-    return (
-        f"https://www.google.com/maps/@?api=1&map_action=pano"
-        f"&viewpoint={lat},{lon}&heading={heading}&pitch={pitch}&fov={fov}"
-    )
+    if heading == 0 and pitch == 0 and fov == 90:
+        # Default camera: reuse the preformatted suffix, only lat/lon get formatted
+        return f"{_SV_PREFIX}{lat},{lon}{_SV_DEFAULT_SUFFIX}"
+    return f"{_SV_PREFIX}{lat},{lon}&heading={heading}&pitch={pitch}&fov={fov}"
+
+
+def street_view_urls(lats, lons, heading=0, pitch=0, fov=90) -> np.ndarray:
+    """Vectorized street_view_url over lat/lon arrays -> object array of URLs."""
+    suffix = f"&heading={heading}&pitch={pitch}&fov={fov}"
+    # NumPy stringifies like the f-string (NaN -> 'nan'); pandas would keep NaN missing
+    lats = np.asarray(lats, dtype=float).astype(str).astype(object)
+    lons = np.asarray(lons, dtype=float).astype(str).astype(object)
+    return _SV_PREFIX + lats + "," + lons + suffix
+
+
+# Color per misplacement bucket: |m| bucket 0..3, +4 for negative m
+_PALETTE_NAMES = ("green", "yellow", "orange", "red", "green", "lightblue", "blue", "purple")
+# Trailing "gray" so get_color_idx's NaN bucket (-1) indexes it directly
+_PALETTE = np.array(_PALETTE_NAMES + ("gray",), dtype=object)
 
 
 def get_color(val: float) -> str:
-    if pd.isna(val):
+    # NaN is the only float unequal to itself; cheaper than pd.isna per call.
+    # pd.NA (nulls read from Arrow-backed frames) must be caught before `!=`.
+    if val is None or val is pd.NA or val != val:
         return "gray"
 
+    # Branch-free bucket: summed threshold comparisons index the palette.
+    # Positive m: green < 0.07 ≤ yellow < 0.095 ≤ orange ≤ 0.15 < red
+    # Negative m: green < 0.07 ≤ lightblue < 0.10 ≤ blue ≤ 0.15 < purple
+    neg = val < 0
     abs_val = abs(val)
+    return _PALETTE_NAMES[
+        4 * neg + (abs_val >= 0.07) + (abs_val >= 0.095 + 0.005 * neg) + (abs_val > 0.15)
+    ]
+
+
+def _as_float_array(vals) -> np.ndarray:
+    # Series.to_numpy maps pd.NA (nullable / Arrow-backed dtypes) to NaN
+    if isinstance(vals, pd.Series):
+        return vals.to_numpy(dtype=float, na_value=np.nan)
+    return np.asarray(vals, dtype=float)
+
+
+def _color_idx_numpy(v: np.ndarray) -> np.ndarray:
+    a = np.abs(v)
+    neg = v < 0
+    # Bucket index from summed threshold comparisons (same edges as get_color)
+    idx = (
+        (a >= 0.07).astype(np.int8)
+        + (a >= np.where(neg, 0.1, 0.095))
+        + (a > 0.15)
+        + 4 * neg
+    ).astype(np.int8)
+    idx[np.isnan(v)] = -1
+    return idx
+
+
+if njit is not None:
+    # Serial loop (LLVM still vectorizes it): parallel=True would start a numba
+    # thread pool from Streamlit's script thread. No fastmath: it would let
+    # LLVM assume away the NaN check.
+    @njit(cache=True)
+    def _color_idx_numba(v):
+        out = np.empty(v.shape[0], np.int8)
+        for i in range(v.shape[0]):
+            x = v[i]
+            if np.isnan(x):
+                out[i] = -1
+                continue
+            a = abs(x)
+            neg = x < 0
+            out[i] = 4 * neg + (a >= 0.07) + (a >= 0.095 + 0.005 * neg) + (a > 0.15)
+        return out
+
+
+def get_color_idx(vals) -> np.ndarray:
+    """int8 palette bucket per misplacement (-1 for NaN); numba kernel when available."""
+    v = _as_float_array(vals)
+    if njit is not None:
+        return _color_idx_numba(v)
+    return _color_idx_numpy(v)
+
+
+def get_colors(vals) -> np.ndarray:
+    """Vectorized get_color: array-like of misplacements -> array of color names."""
+    return _PALETTE[get_color_idx(vals)]
+
+
+def format_numbers(vals, decimals: int, na: str = "—") -> np.ndarray:
+    """Vectorized f"{x:.{decimals}f}" over an array-like; NaN -> `na`."""
+    v = _as_float_array(vals)
+    out = np.char.mod(f"%.{decimals}f", v).astype(object)
+    out[np.isnan(v)] = na
+    return out
+
+
+# Built/compiled once at import instead of on every hex_to_rgb_list call.
+# Tuples, so the shared values can be returned without a per-call copy.
+_NAMED = {
+    "gray": (128, 128, 128),
+    "green": (0, 128, 0),
+    "yellow": (255, 255, 0),
+    "orange": (255, 165, 0),
+    "lightblue": (173, 216, 230),
+    "purple": (128, 0, 128),
+    "blue": (0, 0, 255),
+    "red": (255, 0, 0),
+    "black": (0, 0, 0),
+    "white": (255, 255, 255),
+}
+_RGB_RE = re.compile(r"rgba?\(\s*(\d{1,3})\s*,\s*(\d{1,3})\s*,\s*(\d{1,3})")
 
-    if abs_val < 0.07:
-        return "green"
-
-    if val >= 0:
-        if abs_val < 0.095:
-            return "yellow"
-        elif abs_val > 0.15:
-            return "red"
-        else:
-            return "orange"
-    else:
-        if abs_val < 0.1:
-            return "lightblue"  # e.g., "#ADD8E6"
-        elif abs_val > 0.15:
-            return "purple"  # e.g., "#800080"
-        else:
-            return "blue"  # e.g., "#0000FF"
 
 def hex_to_rgb_list(c: str):
     """Accepts CSS color names (e.g. 'green'), #RRGGBB / #RGB hex, or 'rgb(r,g,b)'.
-    Returns [R, G, B]. Falls back to gray."""
-    NAMED = {
-        "gray": [128, 128, 128],
-        "green": [0, 128, 0],
-        "yellow": [255, 255, 0],
-        "orange": [255, 165, 0],
-        "lightblue": [173, 216, 230],
-        "purple": [128, 0, 128],
-        "blue": [0, 0, 255],
-        "red": [255, 0, 0],
-        "black": [0, 0, 0],
-        "white": [255, 255, 255],
-    }
-
+    Returns (R, G, B). Falls back to gray."""
     # handle NaN / None
-    try:
-        if c is None or (isinstance(c, float) and pd.isna(c)):
-            return NAMED["gray"]
-    except Exception:
-        pass
+    if c is None or (isinstance(c, float) and c != c):
+        return _NAMED["gray"]
 
     s = str(c).strip().lower()
     if not s:
-        return NAMED["gray"]
+        return _NAMED["gray"]
 
     # CSS named color
-    if s in NAMED:
-        return NAMED[s]
+    if s in _NAMED:
+        return _NAMED[s]
 
     # rgb(r,g,b)
-    m = re.match(r"rgba?\(\s*(\d{1,3})\s*,\s*(\d{1,3})\s*,\s*(\d{1,3})", s)
+    m = _RGB_RE.match(s)
     if m:
-        r, g, b = (int(m.group(i)) for i in (1, 2, 3))
-        clamp = lambda x: max(0, min(255, x))
-        return [clamp(r), clamp(g), clamp(b)]
+        r, g, b = map(int, m.groups())
+        # \d{1,3} can't be negative, so only the upper bound needs clamping
+        return (min(r, 255), min(g, 255), min(b, 255))
 
     # hex #RGB or #RRGGBB
     if s.startswith("#"):
@@ -80,16 +159,43 @@ def hex_to_rgb_list(c: str):
         s = "".join(ch * 2 for ch in s)  # expand #abc -> #aabbcc
     if len(s) == 6:
         try:
-            return [int(s[0:2], 16), int(s[2:4], 16), int(s[4:6], 16)]
+            return (int(s[0:2], 16), int(s[2:4], 16), int(s[4:6], 16))
         except Exception:
             pass
 
     # fallback
-    return NAMED["gray"]
+    return _NAMED["gray"]
 
 
-def add_misplacement_legend(m) -> None:
-    template = """
+_NAMED_NAMES = list(_NAMED)
+_NAMED_RGB = np.array([_NAMED[n] for n in _NAMED_NAMES], dtype=np.uint8)
+
+
+def hex_to_rgb_array(colors) -> np.ndarray:
+    """Vectorized hex_to_rgb_list: iterable of colors -> (N, 3) uint8 array."""
+    s = pd.Series(colors, dtype=object)
+    s = s.where(s.notna(), "gray").astype(str).str.strip().str.lower()
+    out = np.empty((len(s), 3), dtype=np.uint8)
+
+    # CSS names: one gather from the palette table
+    codes = pd.Categorical(s, categories=_NAMED_NAMES).codes
+    named = codes >= 0
+    out[named] = _NAMED_RGB[codes[named]]
+
+    # #RRGGBB: decode all of them in one bytes.fromhex call
+    hex6 = ~named & s.str.fullmatch(r"#[0-9a-f]{6}").to_numpy()
+    if hex6.any():
+        packed = bytes.fromhex("".join(v[1:] for v in s[hex6]))
+        out[hex6] = np.frombuffer(packed, dtype=np.uint8).reshape(-1, 3)
+
+    # Everything else (rgb(...), #RGB, bare hex, unknown) is rare: scalar path
+    rest = ~(named | hex6)
+    if rest.any():
+        out[rest] = [hex_to_rgb_list(v) for v in s[rest]]
+    return out
+
+
+_LEGEND_SRC = """
     {% macro html(this, kwargs) %}
     <div style="
         position: fixed; bottom: 20px; left: 20px; z-index:9999;
@@ -113,12 +219,31 @@ def add_misplacement_legend(m) -> None:
     </div>
     {% endmacro %}
     """
+# Parsed once at import; every legend reuses the compiled Jinja template
+_LEGEND_TEMPLATE = Template(_LEGEND_SRC)
+
+
+def add_misplacement_legend(m) -> None:
     macro = MacroElement()
-    macro._template = Template(template)
+    macro._template = _LEGEND_TEMPLATE
     m.get_root().add_child(macro)
 
 
+@lru_cache(maxsize=4096)
+def _img_dir(year: int, month: int, day: int, hour: int, camera: str, rig: str) -> str:
+    # Shared by every image taken in the same hour, so it's formatted once per hour
+    return f"http://10.10.10.100:8173//{camera}/{rig}/{year:04d}/{month:02d}/{day:02d}/{hour:02d}/"
+
+
 def get_img_path(row: pd.Series, camera: str = "FWD", rig: str = "rig-front-uf") -> str:
     camera_filed = f"{camera}_HUSE"
-    img_path = f"http://10.10.10.100:8173//{camera}/{rig}/{row['ts'].strftime('%Y/%m/%d/%H')}/{row[camera_filed]}"
+    ts = row["ts"]
+    img_path = _img_dir(ts.year, ts.month, ts.day, ts.hour, camera, rig) + str(row[camera_filed])
     return img_path
+
+
+def get_img_paths(df: pd.DataFrame, camera: str = "FWD", rig: str = "rig-front-uf") -> pd.Series:
+    """Vectorized get_img_path over a whole DataFrame (one strftime pass over `ts`)."""
+    prefix = f"http://10.10.10.100:8173//{camera}/{rig}/"
+    # map(str) like get_img_path; astype(str) would leave null filenames as NaN
+    return prefix + df["ts"].dt.strftime("%Y/%m/%d/%H/") + df[f"{camera}_HUSE"].map(str)